@@ -1,46 +1,89 @@
+import importlib
+from collections import OrderedDict
+
 import streamlit as st
 import pandas as pd
 
 from utils.io import load_data
-from utils.prep import preprocess, make_tables
-from utils.viz import line_chart, bar_chart, heatmap_polluant_zone, show_summary, map_zones_pollution, map_interactive_zas
-
-import sections.intro as intro
-import sections.overview as overview
-import sections.deep_dives as deep
-import sections.conclusion as conclu
+from utils.prep import preprocess, make_tables, cached_pollutant_tables, stratified_sample, filter_selection, dominant_pollutants
+from utils.episodes import detect_episodes, query_episodes
+from utils.facets import build_facets, days_for, all_zas, selection_key
+from utils.snapshot import current_version, load_snapshot
+from utils.jobs import result as job_result, refresh_when_ready, reset_pending, cancel_session
+from utils.shared import enable_copy_on_write, freeze, session_view, reset_copy_counter, count_copy, record_cache, debug_enabled, show_copy_report
 
 st.set_page_config(page_title="La qualité de l'air en France", layout="wide")
+TOUS_POLLUANTS = "Tous les polluants"
+# Les sections (et Plotly via utils.viz) ne sont importées qu'à l'affichage de leur page.
+SECTIONS = {
+    "Introduction": "sections.intro",
+    "Overview": "sections.overview",
+    "Deep dives": "sections.deep_dives",
+    "Conclusion": "sections.conclusion",
+}
+enable_copy_on_write()
+reset_copy_counter()
+reset_pending()
 
-@st.cache_data(show_spinner=False)
+@st.cache_resource(show_spinner=False)
 def get_data():
     df_raw = load_data()
-    df_clean = preprocess(df_raw)
+    df_clean = freeze(preprocess(df_raw))
     tables = make_tables(df_clean)
+    tables["facets"] = build_facets(df_clean)
+    tables["episodes"] = detect_episodes(df_clean)
+    tables["sample"] = stratified_sample(df_clean)
+    tables["dominant"] = dominant_pollutants(df_clean)
+    tables["per_pollutant"] = OrderedDict()
+    st.session_state["_dataset_loaded"] = True  # exécuté seulement en cas de miss du cache
     return df_clean, tables
 
+@st.cache_resource(show_spinner=False, max_entries=2)
+def get_snapshot(version):
+    tables = load_snapshot(version)
+    tables["facets"] = build_facets(tables["cleaned"])
+    tables["episodes"] = detect_episodes(tables["cleaned"])
+    if tables["sample"].empty:
+        tables["sample"] = stratified_sample(tables["cleaned"])
+    tables["dominant"] = dominant_pollutants(tables["cleaned"])
+    tables["per_pollutant"] = OrderedDict()
+    st.session_state["_dataset_loaded"] = True  # exécuté seulement en cas de miss du cache
+    return tables["cleaned"], tables
+
 st.title("La qualité de l’air en France : une histoire de données")
 st.caption("Source : LCSQA / INERIS / Atmo France — data.gouv.fr — Licence Ouverte Etalab 2.0")
 
-df, _ = get_data()
+snapshot_version = current_version()
+if snapshot_version:
+    df_shared, tables = get_snapshot(snapshot_version)
+else:
+    df_shared, tables = get_data()
+df = session_view(df_shared)
+dataset_loaded = st.session_state.pop("_dataset_loaded", False)
+record_cache("dataset", hits=0 if dataset_loaded else 1, misses=1 if dataset_loaded else 0)
+facets = tables["facets"]
 
 with st.sidebar:
     st.header("Navigation")
-    page = st.radio("Aller vers", ["Introduction", "Overview", "Deep dives", "Conclusion"])
+    page = st.radio("Aller vers", list(SECTIONS))
 
-df_filtered = df
+if st.session_state.get("_page") != page:
+    # Les calculs de la page quittée ne seront plus affichés : on libère les workers.
+    cancel_session()
+    st.session_state["_page"] = page
 
 if page in ["Overview", "Deep dives"]:
     with st.sidebar:
         st.markdown("---")
         st.header("Filtres")
-        polluant_options = sorted(df['Polluant'].dropna().unique())
-        metric = st.selectbox("Polluant", polluant_options)
-        zas_filtered = df[df["Polluant"] == metric]["Zas"].dropna().unique()
-        zas_options = sorted(zas_filtered)
+        metric = st.selectbox("Polluant", facets["polluants"] + [TOUS_POLLUANTS])
+        if metric == TOUS_POLLUANTS:
+            metric = None
+            zas_options = all_zas(facets)
+        else:
+            zas_options = facets["zas"].get(metric, [])
         regions = st.multiselect("Zone (ZAS)", zas_options, default=zas_options)
-        df_temp = df[(df["Polluant"] == metric) & (df["Zas"].isin(regions))]
-        available_days = sorted(df_temp['jour'].dropna().unique())
+        available_days = days_for(facets, metric, regions)
         if available_days:
             date_range = st.select_slider(
                 "Plage de dates",
@@ -49,19 +92,40 @@ if page in ["Overview", "Deep dives"]:
             )
         else:
             date_range = None
+        progressive = page == "Deep dives" and st.checkbox(
+            "Affichage progressif", value=False,
+            help="Affiche d'abord une estimation sur un échantillon stratifié, puis le résultat exact."
+        )
 
-    df_filtered = df.copy()
-    df_filtered = df_filtered[df_filtered['Polluant'] == metric]
-    df_filtered = df_filtered[df_filtered['Zas'].isin(regions)]
-    if date_range:
-        start, end = date_range
-        df_filtered = df_filtered[(df_filtered['jour'] >= start) & (df_filtered['jour'] <= end)]
-
+section = importlib.import_module(SECTIONS[page])
 if page == "Introduction":
-    intro.run(df)
+    section.run(df)
 elif page == "Overview":
-    overview.run(df_filtered, metric=metric)
+    df_filtered = filter_selection(df, metric, regions, date_range)
+    count_copy(df_filtered, "filtres sidebar")
+    polluants = [metric] if metric else facets["polluants"]
+    keys = {p: selection_key(facets, p, regions, date_range) for p in polluants}
+    cache_hits = sum(k in tables["per_pollutant"] for k in keys.values())
+    record_cache("tables_par_polluant", hits=cache_hits, misses=len(keys) - cache_hits)
+    pollutant_tables, stale = job_result("tables", (id(df_shared), tuple(keys.items())), cached_pollutant_tables,
+                                         df_filtered, keys, tables["per_pollutant"], slot=f"tables:{metric}")
+    section.run(df_filtered, metric=metric, pollutant_tables=pollutant_tables, stale=stale)
 elif page == "Deep dives":
-    deep.run(df_filtered, metric=metric)
+    selection = (id(df_shared), metric, tuple(regions), date_range)
+    episodes = query_episodes(tables["episodes"], polluant=metric, regions=regions, date_range=date_range)
+    count_copy(episodes, "épisodes")
+    sample = None
+    if progressive:
+        sample = filter_selection(tables["sample"], metric, regions, date_range)
+        count_copy(sample, "échantillon")
+    section.run(df, metric=metric, regions=regions, date_range=date_range, selection=selection,
+                episodes=episodes, sample=sample, dominant=tables["dominant"])
 else:
-    conclu.run(df)
+    section.run(df)
+
+if debug_enabled():
+    with st.sidebar:
+        st.markdown("---")
+        show_copy_report()
+
+refresh_when_ready()
@@ -0,0 +1,36 @@
+"""
+Check that the per-rerun view handed to the pages cannot alter the shared cached frame:
+writes to numeric and string columns and column inserts must stay local to the view.
+
+Run: python scripts/check_shared_frame.py
+"""
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(root))
+
+from utils.shared import enable_copy_on_write, freeze, session_view
+
+enable_copy_on_write()
+shared = freeze(pd.read_parquet(root / 'data' / 'data_clean.parquet').head(1000))
+reference = shared.copy(deep=True)
+
+try:
+    shared.loc[0, 'valeur'] = -1.0
+except ValueError:
+    pass
+else:
+    sys.exit('FAIL: in-place write on the frozen frame did not raise')
+
+view = session_view(shared)
+view.loc[0, 'Zas'] = 'MODIFIEE'
+view.loc[0, 'valeur'] = -1.0
+view['Polluant'] = 'X'
+view['nouvelle_colonne'] = 1
+
+pd.testing.assert_frame_equal(shared, reference)
+assert view.loc[0, 'Zas'] == 'MODIFIEE' and 'nouvelle_colonne' in view.columns
+print('OK: writes and column inserts on the session view leave the shared frame unchanged')
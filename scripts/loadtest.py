@@ -0,0 +1,187 @@
+"""
+Headless load test: drive app.py in process with N concurrent simulated sessions.
+Each session picks random pages and sidebar filters; every rerun is timed. The
+report gives p50/p95/p99 rerun latency per page, the hit rate of each cache the
+app records per page (dataset, per-pollutant tables, background jobs), the number
+of dataset loads and the peak RSS of the process.
+
+Synthetic data is published as an Arrow snapshot in a temporary directory, so
+no CSV, browser or network access is needed.
+
+Run: python scripts/loadtest.py --sessions 8 --iterations 20 --rows 500000
+"""
+import argparse
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(root))
+
+PAGES = ["Introduction", "Overview", "Deep dives", "Conclusion"]
+FILTER_PAGES = ("Overview", "Deep dives")
+POLLUANTS = ["NO2", "NO", "NOX AS NO2", "PM10", "O3", "PM2.5", "SO2", "CO", "C6H6"]
+ORGANISMES = ["AIRPARIF", "ATMO SUD", "ATMO GRAND EST", "ATMO OCCITANIE", "AIR BREIZH", "ATMO NORMANDIE"]
+VILLES = ["PARIS", "MARSEILLE", "LYON", "TOULOUSE", "NICE", "NANTES", "STRASBOURG", "MONTPELLIER",
+          "BORDEAUX", "LILLE", "RENNES", "REIMS", "GRENOBLE", "DIJON", "ANGERS", "NIMES", "BREST", "TOURS"]
+
+def synthetic_data(rows, n_zas, n_days, seed=0) -> pd.DataFrame:
+    """Random measurements shaped like data_clean.parquet (only the columns the app reads)."""
+    rng = np.random.default_rng(seed)
+    zas = [f"ZAG {VILLES[i % len(VILLES)]}" + (f" {i // len(VILLES)}" if i >= len(VILLES) else "")
+           for i in range(n_zas)]
+    start = np.datetime64("2021-10-14T00")
+    hours = rng.integers(0, n_days * 24, rows)
+    debut = pd.to_datetime(start + hours.astype("timedelta64[h]"))
+    zas_idx = rng.integers(0, n_zas, rows)
+    df = pd.DataFrame({
+        "Date de début": debut,
+        "Date de fin": debut + pd.Timedelta(hours=1),
+        "Organisme": np.array(ORGANISMES)[zas_idx % len(ORGANISMES)],
+        "Zas": np.array(zas)[zas_idx],
+        "Polluant": np.array(POLLUANTS)[rng.integers(0, len(POLLUANTS), rows)],
+        "valeur": rng.gamma(2.0, 12.0, rows).round(1),
+    })
+    df["annee"] = df["Date de début"].dt.year
+    df["mois"] = df["Date de début"].dt.month
+    df["jour"] = df["Date de début"].dt.date
+    df["heure"] = df["Date de début"].dt.hour
+    return df
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else float("nan")
+
+def session(seed, iterations, days, results, lock, errors, start_lock):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    at = AppTest.from_file(str(root / "app.py"), default_timeout=300)
+    # The first run compiles app.py; concurrent ast.parse calls are not thread-safe on CPython 3.11.
+    with start_lock:
+        at.run()
+    # Lookups of the untimed first run are not attributed to any page.
+    seen = dict(at.session_state["_cache_stats"]) if "_cache_stats" in at.session_state else {}
+
+    def timed_run(page):
+        t0 = time.perf_counter()
+        at.run()
+        elapsed = time.perf_counter() - t0
+        stats = dict(at.session_state["_cache_stats"]) if "_cache_stats" in at.session_state else {}
+        with lock:
+            entry = results.setdefault(page, {"latencies": [], "caches": {}})
+            entry["latencies"].append(elapsed)
+            for name, (hits, misses) in stats.items():
+                old_hits, old_misses = seen.get(name, (0, 0))
+                cache = entry["caches"].setdefault(name, [0, 0])
+                cache[0] += hits - old_hits
+                cache[1] += misses - old_misses
+            errors.extend(e.value for e in at.exception)
+        seen.update(stats)
+
+    try:
+        for _ in range(iterations):
+            browse(at, rng, days, timed_run)
+    except Exception as e:
+        with lock:
+            errors.append(repr(e))
+
+def browse(at, rng, days, timed_run):
+    """One visit: open a random page, then change pollutant, ZAS and dates on filter pages."""
+    page = rng.choice(PAGES)
+    at.sidebar.radio[0].set_value(page)
+    timed_run(page)
+    if page not in FILTER_PAGES:
+        return
+    selectbox = at.sidebar.selectbox[0]
+    selectbox.set_value(rng.choice(selectbox.options))
+    timed_run(page)
+    multiselect = at.sidebar.multiselect[0]
+    options = multiselect.options
+    multiselect.set_value(rng.sample(options, rng.randint(1, len(options))))
+    if at.sidebar.select_slider:
+        lo, hi = sorted(rng.sample(range(len(days)), 2)) if len(days) > 1 else (0, 0)
+        at.sidebar.select_slider[0].set_value((days[lo], days[hi]))
+    timed_run(page)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=10, help="pages visited per session")
+    parser.add_argument("--rows", type=int, default=300_000)
+    parser.add_argument("--zas", type=int, default=60)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    snapshot_dir = tempfile.mkdtemp(prefix="air_snapshot_")
+    try:
+        run(args, snapshot_dir)
+    finally:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+def run(args, snapshot_dir):
+    os.environ["AIR_SNAPSHOT_DIR"] = snapshot_dir
+    os.chdir(root)
+
+    import utils.snapshot
+    from utils.prep import make_tables, stratified_sample
+
+    df = synthetic_data(args.rows, args.zas, args.days, seed=args.seed)
+    tables = make_tables(df)
+    tables["sample"] = stratified_sample(df)
+    utils.snapshot.publish_snapshot(tables, root=snapshot_dir)
+    days = sorted(df["jour"].unique())
+
+    loads = []
+    load_snapshot = utils.snapshot.load_snapshot
+    def counted_load(*a, **kw):
+        loads.append(1)
+        return load_snapshot(*a, **kw)
+    utils.snapshot.load_snapshot = counted_load
+
+    results, errors, lock, start_lock = {}, [], threading.Lock(), threading.Lock()
+    threads = [threading.Thread(target=session,
+                                args=(args.seed + i, args.iterations, days, results, lock, errors, start_lock))
+               for i in range(args.sessions)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    total = sum(len(r["latencies"]) for r in results.values())
+    print(f"{args.sessions} sessions, {total} reruns in {wall:.1f}s ({total / wall:.1f} reruns/s), "
+          f"{args.rows:,} synthetic rows")
+    caches = sorted({name for r in results.values() for name in r["caches"]})
+    print(f"{'page':<14}{'reruns':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          + "".join(f"{name:>22}" for name in caches))
+    for page in PAGES:
+        r = results.get(page)
+        if not r:
+            continue
+        lat = r["latencies"]
+        hit_rates = []
+        for name in caches:
+            hits, misses = r["caches"].get(name, (0, 0))
+            hit_rates.append(f"{hits / (hits + misses):.0%} of {hits + misses}" if hits + misses else "-")
+        print(f"{page:<14}{len(lat):>8}{percentile(lat, 50):>10.0f}{percentile(lat, 95):>10.0f}"
+              f"{percentile(lat, 99):>10.0f}" + "".join(f"{h:>22}" for h in hit_rates))
+    print("cache columns: hit rate of lookups made on that page")
+    print(f"dataset loads: {len(loads)} for {total} reruns")
+    print(f"peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+    if errors:
+        print(f"{len(errors)} exceptions, first: {errors[0]}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Startup profile: cold import cost of the app process, broken down by module.
+Each page is measured in a fresh interpreter with `python -X importtime`, importing
+what app.py imports at startup plus the section module of that page.
+
+Run: python scripts/profile_startup.py [--top 15]
+"""
+import argparse
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+root = Path(__file__).resolve().parents[1]
+
+STARTUP = ["streamlit", "utils.io", "utils.prep", "utils.episodes", "utils.facets", "utils.snapshot",
+           "utils.jobs", "utils.shared"]
+PAGES = {
+    "(startup only)": None,
+    "Introduction": "sections.intro",
+    "Overview": "sections.overview",
+    "Deep dives": "sections.deep_dives",
+    "Conclusion": "sections.conclusion",
+}
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def import_times(modules) -> dict:
+    """Temps propre (self, en µs) par module importé, d'après la sortie de -X importtime."""
+    code = "; ".join(f"import {m}" for m in modules)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=root, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    times = {}
+    for line in proc.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            times[match.group(4)] = int(match.group(1))
+    return times
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--top", type=int, default=15, help="packages listed per page")
+    args = parser.parse_args()
+
+    for page, section in PAGES.items():
+        times = import_times(STARTUP + ([section] if section else []))
+        by_package = defaultdict(int)
+        for module, us in times.items():
+            by_package[module.split(".")[0]] += us
+        total = sum(by_package.values())
+        print(f"\n{page}: {total / 1e3:.0f} ms, {len(times)} modules")
+        for package, us in sorted(by_package.items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f"  {package:<24}{us / 1e3:>9.1f} ms{us / total:>8.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""
+Publish the cleaned dataset and its aggregated tables as a memory-mapped Arrow snapshot.
+Every app process maps the same files read-only and picks up the new version on its next rerun.
+
+Run: python scripts/publish_snapshot.py [chemin/vers/data_clean.parquet]
+"""
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(root))
+
+from utils.prep import make_tables, stratified_sample
+from utils.snapshot import publish_snapshot
+
+source = sys.argv[1] if len(sys.argv) > 1 else str(root / 'data' / 'data_clean.parquet')
+df = pd.read_parquet(source)
+tables = make_tables(df)
+tables['sample'] = stratified_sample(df)
+version = publish_snapshot(tables)
+print(f'Snapshot published: {version} ({len(df):,} rows)')
@@ -1,9 +1,10 @@
 import streamlit as st
-from utils.viz import heatmap_polluant_zone, map_zones_pollution, dominant_pollutant_table
-from utils.io import load_data
-from utils.prep import preprocess
+from utils.viz import heatmap_polluant_zone, map_zones_pollution, dominant_pollutant_table, deep_dive_tables, episodes_timeline, approx_zas_chart
+from utils.episodes import query_episodes
+from utils.jobs import result as job_result, poll, stale_notice
+from utils.prep import estimate_means
 
-def run(df, metric=None):
+def run(df, metric=None, regions=None, date_range=None, selection=None, episodes=None, sample=None, dominant=None):
     st.header("Deep dives")
 
     st.write("""
@@ -30,14 +31,43 @@ def run(df, metric=None):
     leur niveau moyen et le volume de mesures associé. Elle met en évidence les
     territoires où la concentration dépasse clairement la moyenne observée ailleurs.
     """)
-    map_zones_pollution(df)
+    # `df` est le dataset complet : le filtrage et les agrégations tournent dans le pool de calcul.
+    job = ("deep_dives", selection, deep_dive_tables, df, metric, regions, date_range)
+    if sample is not None:
+        # Mode progressif : l'estimation sur l'échantillon s'affiche dès le premier rendu, sans attendre.
+        tables = poll(*job, wait=0)
+    else:
+        tables, stale = job_result(*job, slot=f"deep_dives:{metric}")
+        if stale:
+            stale_notice()
+    if tables is None:
+        approx_zas_chart(estimate_means(sample, ['Zas']))
+    else:
+        map_zones_pollution(None, df_zas=tables["zas"])
     
     st.subheader("Quels polluants dominent selon les zones ?")
     st.write("""
     La carte thermique ci-dessous montre si certains polluants sont problématiques
     de manière locale (zones spécifiques) ou globale (présents partout à des niveaux élevés).
     """)
-    heatmap_polluant_zone(df, polluant=metric, key="deep_heatmap")
+    if tables is None:
+        pivot = estimate_means(sample, ['Zas', 'Polluant']).pivot(index='Zas', columns='Polluant', values='valeur_moyenne')
+        st.caption("Valeurs estimées sur l'échantillon stratifié, en attente du calcul exact.")
+        heatmap_polluant_zone(None, polluant=metric, key="deep_heatmap", pivot=pivot)
+    else:
+        heatmap_polluant_zone(None, polluant=metric, key="deep_heatmap", pivot=tables["pivot"], n_rows=tables["n_rows"])
 
-    df_full = preprocess(load_data())
-    dominant_pollutant_table(df_full)
+    if episodes is not None:
+        st.subheader("Quand la pollution dépasse-t-elle les seuils ?")
+        st.write("""
+        Un épisode correspond à des heures consécutives où une zone dépasse le seuil du polluant.
+        NO2, O3 et SO2 sont comparés heure par heure à leur seuil horaire d'information ;
+        PM10 (50 µg/m³) et PM2.5 (15 µg/m³) n'ayant que des valeurs journalières, c'est leur moyenne
+        glissante sur 24 h qui est comparée. Les autres polluants, sans seuil réglementaire, sont
+        comparés à leur propre 95e centile horaire. Pic et dose portent sur les moyennes horaires.
+        """)
+        max_duree = int(episodes['duree_h'].max()) if not episodes.empty else 1
+        min_duree = st.slider("Durée minimale d'un épisode (heures)", 1, max(max_duree, 2), 1, key="episodes_min_duree")
+        episodes_timeline(query_episodes(episodes, min_duree=min_duree))
+
+    dominant_pollutant_table(df, result=dominant)
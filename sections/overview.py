@@ -1,12 +1,15 @@
 import streamlit as st
 from utils.prep import make_tables
-from utils.viz import line_chart, bar_chart
+from utils.jobs import stale_notice
+from utils.viz import line_chart, bar_chart, line_small_multiples, bar_small_multiples
 
-def run(df,metric=None):
+def run(df,metric=None,pollutant_tables=None,stale=False):
     st.header("Overview — premières tendances globales")
 
     if metric:
         st.info(f"Polluant sélectionné : {metric}")
+    else:
+        st.info("Tous les polluants : un petit graphique par polluant")
 
     st.write("""
     Maintenant qu’on a vu où les mesures sont faites, on peut regarder **ce que disent
@@ -26,11 +29,17 @@ def run(df,metric=None):
     st.write("""
     La période des données couvre plusieurs années (2021 - 2025), on y trouve 5 jours de données différentes""")
 
-    tables = make_tables(df)
+    if pollutant_tables is None:
+        pollutant_tables = {metric: make_tables(df)}
 
     st.subheader("Évolution temporelle des niveaux de pollution")
+    if stale:
+        stale_notice()
     st.write("Ce graphique représente l’évolution dans le temps de la valeur moyenne mesurée pour le polluant sélectionné. Chaque point correspond à la moyenne quotidienne des mesures disponibles pour ce polluant sur la période affichée.")
-    line_chart(tables["timeseries"], polluant=metric)
+    if metric:
+        line_chart(pollutant_tables[metric]["timeseries"], polluant=metric)
+    else:
+        line_small_multiples(pollutant_tables)
     st.write("""
     Par exemple, on peut prendre le cas du polluant PM10. On observe, sur la période entre ocotbre 2021 et septembre 2025, une baisse progressive, avec une chute drastique entre 14 avril 2025
              et 14 septembre 2025 des concentrations moyennes avant
@@ -38,7 +47,10 @@ def run(df,metric=None):
 
     st.subheader("Comparaison entre zones géographiques")
     st.write("Ce graphique permet de repérer les zones ZAS présentant des niveaux moyens plus élevés que les autres.")
-    bar_chart(tables["by_region"], polluant=metric)
+    if metric:
+        bar_chart(pollutant_tables[metric]["by_region"], polluant=metric)
+    else:
+        bar_small_multiples(pollutant_tables)
     st.write("""
         Dans la continuité de notre exemple des PM10. Dans ce cas précis, les zones ultramarines (comme Mayotte, 
              Pointe-à-Pitre ou encore Fort-de-France)montrent des niveaux moyens nettement plus élevées que la plupart des zones métropolitaines. """)
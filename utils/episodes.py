@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+# Seuils horaires d'information et de recommandation (µg/m³), comparés à la moyenne horaire.
+SEUILS = {
+    'NO2': 200,
+    'O3': 180,
+    'SO2': 300,
+}
+# PM10 et PM2.5 n'ont que des valeurs journalières (seuil français PM10, ligne OMS PM2.5) :
+# elles sont comparées à la moyenne glissante sur 24 h, pas à la moyenne horaire.
+SEUILS_24H = {
+    'PM10': 50,
+    'PM2.5': 15,
+}
+# Heures mesurées exigées dans la fenêtre de 24 h pour calculer la moyenne glissante.
+MIN_HEURES_24H = 18
+# Pour les polluants sans seuil, un épisode = dépassement du quantile de leur propre série.
+QUANTILE_DEFAUT = 0.95
+
+COLONNES = ['Zas', 'Polluant', 'debut', 'fin', 'duree_h', 'pic', 'dose', 'seuil', 'reference']
+
+def hourly_series(df: pd.DataFrame) -> pd.Series:
+    """Moyenne horaire par (Zas, Polluant) sur l'ensemble des sites : un seul tri pour toutes les séries."""
+    return df.groupby(['Zas', 'Polluant', 'Date de début'])['valeur'].mean()
+
+def rolling_24h(s: pd.Series) -> pd.Series:
+    """Moyenne glissante sur 24 h de chaque série (Zas, Polluant), dans l'ordre de `s`."""
+    # `s` est trié par série puis par heure : les groupes ressortent dans le même ordre.
+    rolled = (s.reset_index().groupby(['Zas', 'Polluant'], sort=False)
+              .rolling('24h', on='Date de début', min_periods=MIN_HEURES_24H)['valeur'].mean())
+    return pd.Series(rolled.to_numpy(), index=s.index)
+
+def detect_episodes(df: pd.DataFrame, seuils=None, seuils_24h=None, quantile=QUANTILE_DEFAUT) -> pd.DataFrame:
+    """
+    Détecte les épisodes de pollution (heures consécutives au-dessus du seuil) de toutes les séries
+    (Zas, Polluant) en même temps, par encodage des plages (diff / cumsum) sur les tableaux numpy.
+    Les seuils horaires portent sur la moyenne horaire, les seuils journaliers sur la moyenne
+    glissante 24 h. Renvoie un épisode par ligne : début, fin, durée (h), pic et dose intégrée
+    (µg/m³·h) des moyennes horaires, seuil utilisé et grandeur comparée (`reference`).
+    """
+    seuils = SEUILS if seuils is None else seuils
+    seuils_24h = SEUILS_24H if seuils_24h is None else seuils_24h
+    s = hourly_series(df)
+    if s.empty:
+        return pd.DataFrame(columns=COLONNES)
+    zas_codes, pol_codes, _ = s.index.codes
+    zas_levels, pol_levels, _ = s.index.levels
+    t = s.index.get_level_values('Date de début').to_numpy()
+    v = s.to_numpy(dtype=float)
+
+    hourly = pd.Series(seuils, dtype=float).reindex(pol_levels)
+    daily = pd.Series(seuils_24h, dtype=float).reindex(pol_levels)
+    references = np.where(hourly.notna(), 'horaire',
+                          np.where(daily.notna(), 'moyenne 24 h', f"{quantile * 100:.0f}e centile"))
+    thresholds = hourly.fillna(daily)
+    missing = thresholds.isna()
+    if missing.any():
+        q = s.groupby(level='Polluant').quantile(quantile)
+        thresholds[missing] = q.reindex(thresholds.index[missing]).to_numpy()
+    thr = thresholds.to_numpy()[pol_codes]
+    ref = references[pol_codes]
+
+    compared = v
+    on_24h = ref == 'moyenne 24 h'
+    if on_24h.any():
+        compared = v.copy()
+        compared[on_24h] = rolling_24h(s[on_24h]).to_numpy()
+
+    above = compared > thr
+    new_series = np.r_[True, (zas_codes[1:] != zas_codes[:-1]) | (pol_codes[1:] != pol_codes[:-1])]
+    gap = np.r_[True, np.diff(t) != np.timedelta64(1, 'h')]
+    starts = above & (new_series | gap | ~np.r_[False, above[:-1]])
+
+    idx = np.flatnonzero(above)
+    if len(idx) == 0:
+        return pd.DataFrame(columns=COLONNES)
+    run_id = np.cumsum(starts)[idx]
+    bounds = np.flatnonzero(np.r_[True, np.diff(run_id) != 0])
+    duree = np.diff(np.r_[bounds, len(idx)])
+    first, last = idx[bounds], idx[bounds + duree - 1]
+    episodes = pd.DataFrame({
+        'Zas': np.asarray(zas_levels)[zas_codes[first]],
+        'Polluant': np.asarray(pol_levels)[pol_codes[first]],
+        'debut': t[first],
+        'fin': t[last] + np.timedelta64(1, 'h'),
+        'duree_h': duree,
+        'pic': np.maximum.reduceat(v[idx], bounds),
+        'dose': np.add.reduceat(v[idx], bounds),
+        'seuil': thr[first],
+        'reference': ref[first],
+    })
+    return episodes.sort_values('debut', ignore_index=True)
+
+def query_episodes(episodes: pd.DataFrame, polluant=None, regions=None, date_range=None, min_duree=1) -> pd.DataFrame:
+    """Filtre l'index des épisodes (petit tableau : instantané, sans repasser sur les mesures)."""
+    if episodes.empty:
+        return episodes
+    mask = episodes['duree_h'] >= min_duree
+    if polluant:
+        mask &= episodes['Polluant'] == polluant
+    if regions is not None:
+        mask &= episodes['Zas'].isin(regions)
+    if date_range:
+        start, end = date_range
+        jours = episodes['debut'].dt.date
+        mask &= (jours >= start) & (jours <= end)
+    return episodes[mask]
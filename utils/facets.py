@@ -0,0 +1,58 @@
+import pandas as pd
+
+def build_facets(df: pd.DataFrame) -> dict:
+    """
+    Catalogue des options de la sidebar, calculé une seule fois au chargement :
+    - polluants : liste triée des polluants
+    - zas : ZAS disponibles pour chaque polluant
+    - days : tous les jours présents, triés (position = numéro de bit)
+    - bits : jours disponibles par (polluant, ZAS), encodés en bitset (entier Python)
+    - counts : nombre de mesures par (polluant, ZAS)
+    """
+    counts = df.groupby(['Polluant', 'Zas', 'jour']).size()
+    days = sorted(counts.index.get_level_values('jour').unique())
+    day_bit = {d: 1 << i for i, d in enumerate(days)}
+    bits, totals, zas = {}, {}, {}
+    for (polluant, z, jour), n in counts.items():
+        bits[(polluant, z)] = bits.get((polluant, z), 0) | day_bit[jour]
+        totals[(polluant, z)] = totals.get((polluant, z), 0) + int(n)
+        zas.setdefault(polluant, set()).add(z)
+    return {
+        "polluants": sorted(zas),
+        "zas": {p: sorted(z) for p, z in zas.items()},
+        "days": days,
+        "bits": bits,
+        "counts": totals,
+    }
+
+def days_mask(facets: dict, polluant, regions) -> int:
+    """OU des bitsets des ZAS sélectionnées pour un polluant (tous les polluants si None)."""
+    mask = 0
+    if polluant is None:
+        regions = set(regions)
+        for (_, z), bits in facets["bits"].items():
+            if z in regions:
+                mask |= bits
+        return mask
+    for z in regions:
+        mask |= facets["bits"].get((polluant, z), 0)
+    return mask
+
+def days_for(facets: dict, polluant, regions) -> list:
+    mask = days_mask(facets, polluant, regions)
+    return [d for i, d in enumerate(facets["days"]) if mask >> i & 1]
+
+def all_zas(facets: dict) -> list:
+    return sorted(set().union(*facets["zas"].values()))
+
+def selection_key(facets: dict, polluant, regions, date_range=None) -> tuple:
+    """
+    Clé de cache normalisée d'une sélection pour un polluant : ZAS effectivement mesurées
+    et bitset des jours retenus. Deux sélections de même clé filtrent exactement les mêmes lignes.
+    """
+    zas = frozenset(z for z in regions if (polluant, z) in facets["bits"])
+    mask = days_mask(facets, polluant, zas)
+    if date_range:
+        start, end = date_range
+        mask &= sum(1 << i for i, d in enumerate(facets["days"]) if start <= d <= end)
+    return (polluant, zas, mask)
@@ -1,7 +1,7 @@
 import pandas as pd
 import streamlit as st
 
-@st.cache_data
+@st.cache_resource(show_spinner=False)
 def load_data():
     fichiers = ['data/FR_E2_2021-10-14.csv','data/FR_E2_2024-10-14.csv','data/FR_E2_2025-04-14.csv','data/FR_E2_2025-09-14.csv','data/FR_E2_2025-10-14.csv']
     df_list = []
@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+import uuid
+from concurrent import futures
+
+import streamlit as st
+
+from utils.shared import copy_counter, counting_into, record_cache
+
+MAX_JOBS = 512
+
+class Cancelled(Exception):
+    """Levée par un calcul dont la sélection a été remplacée par une plus récente."""
+
+class _Registry:
+    """Dernier calcul soumis par (session, type de calcul), avec son jeton d'annulation."""
+    def __init__(self, workers):
+        self.pool = futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aggregation")
+        self.lock = threading.Lock()
+        self.jobs = {}
+
+@st.cache_resource(show_spinner=False)
+def _registry():
+    return _Registry(int(os.environ.get("AIR_WORKERS", min(4, os.cpu_count() or 1))))
+
+def _session_id():
+    return st.session_state.setdefault("_session_id", uuid.uuid4().hex)
+
+def _run(token, fn, args, counter):
+    # Les opérations pandas ne sont pas interruptibles : on vérifie le jeton avant et après le calcul.
+    if token.is_set():
+        raise Cancelled()
+    with counting_into(counter):
+        result = fn(*args)
+    if token.is_set():
+        raise Cancelled()
+    return result
+
+def submit(kind: str, key, fn, *args):
+    """
+    Soumet fn(*args) au pool partagé pour la session courante. Une soumission avec une autre clé
+    annule le calcul précédent du même type (retiré de la file s'il n'a pas démarré) ;
+    une soumission avec la même clé réutilise le calcul en cours ou terminé.
+    """
+    registry = _registry()
+    job_id = (_session_id(), kind)
+    with registry.lock:
+        previous = registry.jobs.get(job_id)
+        reuse = previous is not None and previous[0] == key and not previous[1].cancelled()
+        if reuse:
+            future = previous[1]
+        else:
+            if previous:
+                previous[2].set()
+                previous[1].cancel()
+            token = threading.Event()
+            future = registry.pool.submit(_run, token, fn, args, copy_counter())
+            registry.jobs[job_id] = (key, future, token)
+            if len(registry.jobs) > MAX_JOBS:
+                # Sessions fermées : on oublie les calculs terminés les plus anciens.
+                for old in [j for j, (_, f, _) in registry.jobs.items() if f.done()][:len(registry.jobs) - MAX_JOBS]:
+                    del registry.jobs[old]
+    record_cache(f"calcul {kind}", hits=int(reuse), misses=int(not reuse))
+    return future
+
+def result(kind: str, key, fn, *args, slot=None, wait=0.3):
+    """
+    Renvoie (résultat, périmé). Si le calcul n'est pas terminé après `wait` secondes, renvoie le
+    dernier résultat obtenu pour `slot` (par défaut `kind`) avec périmé=True ; la page est relancée
+    à la fin du script par refresh_when_ready(). Sans résultat précédent, on attend le calcul
+    via _wait_for(), qui reste interruptible par un changement de widget.
+    """
+    slot = slot or kind
+    future = submit(kind, key, fn, *args)
+    last = st.session_state.setdefault("_last_results", {})
+    if slot in last:
+        try:
+            value = future.result(timeout=wait)
+        except futures.TimeoutError:
+            st.session_state["_pending_jobs"] = True
+            return last[slot], True
+    else:
+        _wait_for([future], "Calcul en cours…")
+        value = future.result()
+    last[slot] = value
+    return value, False
+
+def poll(kind: str, key, fn, *args, wait=0.2):
+    """Comme result(), sans attendre ni résultat précédent : renvoie None si le calcul n'est pas prêt."""
+    future = submit(kind, key, fn, *args)
+    try:
+        return future.result(timeout=wait)
+    except futures.TimeoutError:
+        st.session_state["_pending_jobs"] = True
+        return None
+
+def reset_pending():
+    """À appeler en début de script : un rerun interrompu avant refresh_when_ready() laisse le drapeau levé."""
+    st.session_state.pop("_pending_jobs", None)
+
+def cancel_session():
+    """Annule et oublie tous les calculs de la session courante (changement de page)."""
+    registry = _registry()
+    session = _session_id()
+    with registry.lock:
+        for job_id in [j for j in registry.jobs if j[0] == session]:
+            _, future, token = registry.jobs.pop(job_id)
+            token.set()
+            future.cancel()
+
+def stale_notice():
+    st.caption("Calcul en cours pour la nouvelle sélection : affichage du dernier résultat disponible.")
+
+def _wait_for(pending, label, poll=0.2):
+    """
+    Attend la fin des calculs en mettant à jour un placeholder à chaque tour : Streamlit peut ainsi
+    interrompre la boucle dès qu'un widget change (le nouveau rerun annule alors les calculs périmés).
+    """
+    placeholder = st.empty()
+    start = time.perf_counter()
+    while not all(f.done() for f in pending):
+        placeholder.caption(f"{label} {time.perf_counter() - start:.1f} s")
+        time.sleep(poll)
+    placeholder.empty()
+
+def refresh_when_ready(poll=0.2):
+    """À appeler en fin de script : attend les calculs en cours de la session puis relance la page."""
+    if not st.session_state.pop("_pending_jobs", False):
+        return
+    registry = _registry()
+    session = _session_id()
+    with registry.lock:
+        pending = [f for (sid, _), (_, f, _) in registry.jobs.items() if sid == session]
+    _wait_for(pending, "Mise à jour en cours…", poll)
+    st.rerun()
@@ -1,5 +1,10 @@
+from collections import OrderedDict
+
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+
+from utils.shared import count_copy
 
 def preprocess(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -14,11 +19,14 @@ def preprocess(df: pd.DataFrame) -> pd.DataFrame:
       7. Suppression des doublons et colonnes inutiles
       8. Sauvegarde du dataset propre
     """
+    # Copie superficielle : le DataFrame brut est partagé entre sessions, on ne le modifie pas.
+    df = df.copy(deep=False)
     df['Date de début'] = pd.to_datetime(df['Date de début'], errors='coerce')
     df['Date de fin']   = pd.to_datetime(df['Date de fin'], errors='coerce')
     df['annee'] = df['Date de début'].dt.year
     df['mois']  = df['Date de début'].dt.month
-    df['jour']  = df['Date de début'].dt.date
+    # Jours en date32 Arrow, comme à la relecture d'un snapshot (pas d'objets datetime.date par ligne).
+    df['jour']  = df['Date de début'].dt.date.astype(pd.ArrowDtype(pa.date32()))
     df['heure'] = df['Date de début'].dt.hour
     for i in ['Polluant', "type d'implantation", "type d'influence", 'Zas', 'Organisme']:
         if i in df.columns:
@@ -90,9 +98,113 @@ def make_tables(df: pd.DataFrame) -> dict:
     - Comptage par polluant (by_pollutant)
     """
     table_timeseries = df.groupby('jour', as_index=False)['valeur'].mean().rename(columns={'valeur': 'valeur_moyenne'})
+    # Plotly ne sait pas tracer les dates Arrow : les séries (petites) passent en datetime64.
+    table_timeseries['jour'] = table_timeseries['jour'].astype('datetime64[s]')
     if 'Zas' in df.columns:
         table_region = df.groupby('Zas', as_index=False)['valeur'].mean().rename(columns={'valeur': 'valeur_moyenne'})
     else:
         table_region = pd.DataFrame()
     table_polluants = df['Polluant'].value_counts().reset_index().rename(columns={'index': 'Polluant', 'Polluant': 'Nombre_mesures'})
     return {"cleaned": df, "timeseries": table_timeseries, "by_region": table_region, "by_pollutant": table_polluants}
+
+def make_tables_by_pollutant(df: pd.DataFrame) -> dict:
+    """
+    Moyennes journalières et moyennes par ZAS de tous les polluants en une seule passe groupée.
+    Renvoie {polluant: {"timeseries": ..., "by_region": ...}} au même format que make_tables.
+    """
+    ts = df.groupby(['Polluant', 'jour'], as_index=False)['valeur'].mean().rename(columns={'valeur': 'valeur_moyenne'})
+    ts['jour'] = ts['jour'].astype('datetime64[s]')
+    reg = df.groupby(['Polluant', 'Zas'], as_index=False)['valeur'].mean().rename(columns={'valeur': 'valeur_moyenne'})
+    tables = {p: {"timeseries": g.drop(columns='Polluant').reset_index(drop=True)} for p, g in ts.groupby('Polluant')}
+    for p, g in reg.groupby('Polluant'):
+        tables.setdefault(p, {"timeseries": pd.DataFrame()})["by_region"] = g.drop(columns='Polluant').reset_index(drop=True)
+    return tables
+
+def filter_selection(frame: pd.DataFrame, metric, regions, date_range) -> pd.DataFrame:
+    """Lignes de la sélection de la sidebar (polluant, ZAS, plage de jours) ; metric=None garde tous les polluants."""
+    mask = frame['Zas'].isin(regions)
+    if metric:
+        mask &= frame['Polluant'] == metric
+    if date_range:
+        start, end = date_range
+        mask &= frame['jour'].between(start, end).to_numpy(dtype=bool, na_value=False)
+    return frame[mask]
+
+def dominant_pollutants(df: pd.DataFrame, value_col='valeur') -> pd.DataFrame:
+    """
+    Moyenne par polluant et polluant dominant de chaque ZAS. Ne dépend pas des filtres :
+    calculé une fois au chargement du dataset plutôt qu'à chaque rerun.
+    """
+    pivot = df.groupby(['Zas', 'Polluant'], as_index=False)[value_col].mean().pivot(
+        index='Zas', columns='Polluant', values=value_col)
+    if pivot.empty:
+        return pd.DataFrame()
+    result = pivot.reset_index()
+    result['dominant_pollutant'] = pivot.idxmax(axis=1).values
+    result['dominant_valeur'] = pivot.max(axis=1).values.round(4)
+    return result
+
+def cached_pollutant_tables(df: pd.DataFrame, keys: dict, store: OrderedDict, maxsize=256) -> dict:
+    """
+    Tables par polluant mises en cache individuellement dans `store` (clé = selection_key).
+    Les polluants absents du cache sont calculés ensemble en une seule passe ; éviction FIFO.
+    """
+    result, missing = {}, []
+    for p, k in keys.items():
+        t = store.get(k)
+        if t is None:
+            missing.append(p)
+        else:
+            result[p] = t
+    if missing:
+        subset = df
+        if len(missing) < len(keys):
+            subset = df[df['Polluant'].isin(missing)]
+            count_copy(subset, "tables par polluant")
+        computed = make_tables_by_pollutant(subset)
+        for p in missing:
+            t = computed.get(p, {})
+            result[p] = {"timeseries": t.get("timeseries", pd.DataFrame()),
+                         "by_region": t.get("by_region", pd.DataFrame())}
+            store[keys[p]] = result[p]
+    while len(store) > maxsize:
+        store.popitem(last=False)
+    return result
+
+def stratified_sample(df: pd.DataFrame, frac=0.05, min_per_stratum=30, seed=0) -> pd.DataFrame:
+    """
+    Échantillon stratifié par (Polluant, Zas), calculé à l'ingestion : chaque strate garde
+    max(min_per_stratum, frac * taille) mesures tirées au hasard (toutes si la strate est plus petite).
+    La colonne `poids` (taille de la strate / taille de l'échantillon) sert à l'estimation.
+    """
+    cols = [c for c in ['Polluant', 'Zas', 'Organisme', 'jour', 'valeur'] if c in df.columns]
+    rng = np.random.default_rng(seed)
+    groups = df.groupby(['Polluant', 'Zas'])
+    taille = groups['valeur'].transform('size')
+    quota = np.minimum(taille, np.maximum(min_per_stratum, np.ceil(frac * taille)))
+    rang = pd.Series(rng.random(len(df)), index=df.index).groupby([df['Polluant'], df['Zas']]).rank(method='first')
+    keep = (rang <= quota).to_numpy()
+    sample = df.loc[keep, cols].reset_index(drop=True)
+    sample['poids'] = (taille / quota).to_numpy()[keep]
+    return sample
+
+def estimate_means(sample: pd.DataFrame, by, z=1.96) -> pd.DataFrame:
+    """
+    Moyennes estimées sur l'échantillon stratifié, avec intervalle de confiance à 95 %.
+    Chaque groupe `by` est un agrégat de strates (Polluant, Zas) : moyenne pondérée par la taille
+    estimée des strates et variance stratifiée avec correction de population finie.
+    """
+    if sample.empty:
+        return pd.DataFrame(columns=list(by) + ['valeur_moyenne', 'ic', 'nb_mesures_estime', 'nb_echantillon'])
+    keys = list(dict.fromkeys(list(by) + ['Polluant', 'Zas']))
+    strates = sample.groupby(keys).agg(N=('poids', 'sum'), n=('valeur', 'size'), moyenne=('valeur', 'mean'), var=('valeur', 'var'))
+    strates['var'] = strates['var'].fillna(0.0)
+    strates['wmean'] = strates['N'] * strates['moyenne']
+    strates['wvar'] = strates['N'] ** 2 * (1 - strates['n'] / strates['N']).clip(lower=0) * strates['var'] / strates['n']
+    est = strates.groupby(level=list(by)).agg(N=('N', 'sum'), n=('n', 'sum'), wmean=('wmean', 'sum'), wvar=('wvar', 'sum'))
+    return pd.DataFrame({
+        'valeur_moyenne': est['wmean'] / est['N'],
+        'ic': z * np.sqrt(est['wvar']) / est['N'],
+        'nb_mesures_estime': est['N'].round().astype(int),
+        'nb_echantillon': est['n'],
+    }).reset_index()
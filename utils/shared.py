@@ -0,0 +1,90 @@
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+def enable_copy_on_write():
+    """Active le copy-on-write de pandas (toujours actif à partir de pandas 3)."""
+    if int(pd.__version__.split(".")[0]) < 3:
+        pd.set_option("mode.copy_on_write", True)
+
+def freeze(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rend le DataFrame partagé immuable : les tableaux numpy sous-jacents passent en lecture seule,
+    donc toute écriture en place (df.loc[...] = ...) lève une ValueError au lieu de modifier
+    silencieusement les données de toutes les sessions. Les colonnes texte (tableaux Arrow) et
+    l'ajout de colonnes ne sont pas couverts : les pages travaillent donc sur session_view().
+    Inutile sur un snapshot : les tampons Arrow mappés en mémoire sont déjà en lecture seule.
+    """
+    for col in df.columns:
+        # to_numpy() sur une colonne Arrow matérialiserait une copie objet : seules les colonnes numpy.
+        if not isinstance(df[col].dtype, np.dtype):
+            continue
+        arr = df[col].to_numpy()
+        while isinstance(arr.base, np.ndarray):
+            arr = arr.base
+        arr.flags.writeable = False
+    return df
+
+def session_view(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Vue propre au rerun sur le DataFrame partagé (copie superficielle, aucune donnée copiée).
+    Avec le copy-on-write, toute écriture sur la vue (colonnes texte comprises, ajout de colonne)
+    reste locale : le DataFrame en cache n'est jamais exposé directement aux pages.
+    """
+    return df.copy(deep=False)
+
+def debug_enabled() -> bool:
+    return bool(os.environ.get("AIR_DEBUG")) or "debug" in st.query_params
+
+def reset_copy_counter():
+    """À appeler en tête de script : le compteur couvre un seul rerun."""
+    st.session_state["_bytes_copied"] = {}
+
+_local = threading.local()
+
+def copy_counter():
+    """
+    Compteur du rerun courant ; dans un calcul en arrière-plan, celui du rerun qui l'a soumis.
+    None hors mode debug : le comptage (memory_usage(deep=True)) coûte trop cher à chaque rerun.
+    """
+    if getattr(_local, "bound", False):
+        return _local.counter
+    if not debug_enabled():
+        return None
+    return st.session_state.setdefault("_bytes_copied", {})
+
+@contextmanager
+def counting_into(counter):
+    """Rattache les copies faites dans ce thread (pool de calcul) au compteur d'un rerun."""
+    _local.bound, _local.counter = True, counter
+    try:
+        yield
+    finally:
+        _local.bound, _local.counter = False, None
+
+def count_copy(df: pd.DataFrame, label: str):
+    """Ajoute au compteur du rerun la taille d'une copie matérialisée (filtre, sous-ensemble...)."""
+    counter = copy_counter()
+    if counter is None:
+        return
+    counter[label] = counter.get(label, 0) + int(df.memory_usage(index=True, deep=True).sum())
+
+def record_cache(name: str, hits=0, misses=0):
+    """Compteurs de cache de la session (lus par le rapport de debug et le test de charge)."""
+    stats = st.session_state.setdefault("_cache_stats", {})
+    h, m = stats.get(name, (0, 0))
+    stats[name] = (h + hits, m + misses)
+
+def show_copy_report():
+    # Copie du dict : les calculs en arrière-plan peuvent encore y ajouter des entrées.
+    counter = dict(st.session_state.get("_bytes_copied", {}))
+    total = sum(counter.values())
+    st.caption(f"Octets copiés pendant ce rerun : {total / 1e6:.2f} Mo")
+    for label, n in sorted(counter.items(), key=lambda kv: -kv[1]):
+        st.caption(f"- {label} : {n / 1e6:.2f} Mo")
+    for name, (hits, misses) in st.session_state.get("_cache_stats", {}).items():
+        st.caption(f"Cache {name} : {hits} hits / {misses} misses")
@@ -0,0 +1,71 @@
+import os
+import shutil
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+SNAPSHOT_ROOT = os.environ.get("AIR_SNAPSHOT_DIR", "data/snapshots")
+POINTER = "CURRENT"
+TABLES = ("cleaned", "timeseries", "by_region", "by_pollutant", "sample")
+# Sans ce mapping, les colonnes date32 (`jour`) seraient converties en objets datetime.date, copiés par processus.
+ARROW_TYPES = {pa.date32(): pd.ArrowDtype(pa.date32())}
+
+def publish_snapshot(tables: dict, root=SNAPSHOT_ROOT, keep=3) -> str:
+    """
+    Publie le dataset nettoyé et les tables agrégées sous forme de fichiers Arrow IPC (Feather v2).
+    Les fichiers sont écrits sans compression et en un seul bloc (record batch) pour pouvoir être
+    mappés en mémoire tels quels : avec plusieurs blocs, to_pandas() devrait les concaténer (copie).
+    Le fichier pointeur CURRENT est remplacé de façon atomique une fois la version complète,
+    ce qui permet aux processus déjà lancés de basculer sans redémarrage.
+    """
+    os.makedirs(root, exist_ok=True)
+    version = time.strftime("%Y%m%dT%H%M%S") + f"-{os.getpid()}"
+    tmp_dir = os.path.join(root, f".{version}.tmp")
+    os.makedirs(tmp_dir)
+    for name in TABLES:
+        table = tables.get(name)
+        if table is None or table.empty:
+            continue
+        feather.write_feather(table.reset_index(drop=True), os.path.join(tmp_dir, f"{name}.arrow"),
+                              compression="uncompressed", chunksize=len(table))
+    os.rename(tmp_dir, os.path.join(root, version))
+    tmp_pointer = os.path.join(root, f".{POINTER}.tmp")
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_pointer, os.path.join(root, POINTER))
+    _prune(root, keep)
+    return version
+
+def current_version(root=SNAPSHOT_ROOT):
+    """Version pointée par CURRENT, ou None si aucun snapshot n'a été publié."""
+    try:
+        with open(os.path.join(root, POINTER), encoding="utf-8") as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return version if os.path.isdir(os.path.join(root, version)) else None
+
+def load_snapshot(version, root=SNAPSHOT_ROOT) -> dict:
+    """
+    Ouvre une version en lecture seule via mmap : les colonnes numériques et `jour` (date32 Arrow)
+    sont des vues sans copie sur le cache de pages partagé entre tous les processus du serveur.
+    """
+    tables = {}
+    for name in TABLES:
+        path = os.path.join(root, version, f"{name}.arrow")
+        if not os.path.exists(path):
+            tables[name] = pd.DataFrame()
+            continue
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        tables[name] = table.to_pandas(split_blocks=True, types_mapper=ARROW_TYPES.get)
+    return tables
+
+def _prune(root, keep):
+    versions = sorted(d for d in os.listdir(root)
+                      if not d.startswith(".") and os.path.isdir(os.path.join(root, d)))
+    for old in versions[:-keep]:
+        # Les processus qui mappent encore une ancienne version gardent leurs pages : on peut supprimer.
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
@@ -1,7 +1,8 @@
 import streamlit as st
 import plotly.express as px
-import plotly.graph_objects as go
 import pandas as pd
+from utils.shared import count_copy
+from utils.prep import filter_selection, dominant_pollutants
 
 def line_chart(df_timeseries: pd.DataFrame, polluant=None):
     if df_timeseries.empty:
@@ -25,35 +26,79 @@ def bar_chart(df_region: pd.DataFrame, polluant=None):
     fig.update_layout(xaxis_title="Zone géographique (ZAS)",yaxis_title="Valeur moyenne",margin=dict(l=40, r=40, t=60, b=40))
     st.plotly_chart(fig, use_container_width=True, key="bar_chart_fig")
 
-def heatmap_polluant_zone(df: pd.DataFrame, key=None, polluant=None):
-    st.markdown("#### Carte thermique : moyenne des polluants par zone (ZAS)")
-    if df is None or len(df) == 0:
-        st.warning("Pas de données dans le DataFrame fourni à la heatmap.")
-        return
-    value_col = None
-    if 'valeur' in df.columns:
-        value_col = 'valeur'
-    elif 'valeur_moyenne' in df.columns:
-        value_col = 'valeur_moyenne'
-    else:
-        st.warning("Les colonnes nécessaires ('valeur' ou 'valeur_moyenne') sont manquantes. Vérifiez le prétraitement.")
+def _facet_frame(tables_by_pollutant: dict, name: str) -> pd.DataFrame:
+    frames = [t[name].assign(Polluant=p) for p, t in tables_by_pollutant.items() if not t[name].empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def line_small_multiples(tables_by_pollutant: dict, wrap=3):
+    data = _facet_frame(tables_by_pollutant, "timeseries")
+    if data.empty:
+        st.warning("Aucune donnée disponible pour la série temporelle.")
         return
-    if not all(col in df.columns for col in ['Zas', 'Polluant']):
-        st.warning("Les colonnes nécessaires ('Zas', 'Polluant') sont manquantes.")
+    n_rows = -(-data['Polluant'].nunique() // wrap)
+    fig = px.line(data,x='jour',y='valeur_moyenne',facet_col='Polluant',facet_col_wrap=wrap,markers=True,template='plotly_white')
+    fig.update_traces(line=dict(color="#0072B2", width=2))
+    fig.update_yaxes(matches=None, showticklabels=True, title=None)
+    fig.update_xaxes(title=None)
+    fig.for_each_annotation(lambda a: a.update(text=a.text.split("=")[-1]))
+    fig.update_layout(height=260 * n_rows, showlegend=False, margin=dict(l=40, r=40, t=60, b=40))
+    st.plotly_chart(fig, use_container_width=True, key="line_small_multiples_fig")
+
+def bar_small_multiples(tables_by_pollutant: dict, wrap=3):
+    data = _facet_frame(tables_by_pollutant, "by_region")
+    if data.empty:
+        st.warning("Aucune donnée disponible pour la comparaison par région.")
         return
-    df_used = df.copy()
+    n_rows = -(-data['Polluant'].nunique() // wrap)
+    data = data.sort_values(['Polluant', 'valeur_moyenne'], ascending=[True, False])
+    fig = px.bar(data,x='Zas',y='valeur_moyenne',facet_col='Polluant',facet_col_wrap=wrap,color='valeur_moyenne',
+                 color_continuous_scale='Tealgrn',template='plotly_white')
+    fig.update_xaxes(matches=None, showticklabels=False, title=None)
+    fig.update_yaxes(matches=None, showticklabels=True, title=None)
+    fig.for_each_annotation(lambda a: a.update(text=a.text.split("=")[-1]))
+    fig.update_layout(height=260 * n_rows, coloraxis_showscale=False, margin=dict(l=40, r=40, t=60, b=40))
+    st.plotly_chart(fig, use_container_width=True, key="bar_small_multiples_fig")
+
+def heatmap_table(df: pd.DataFrame, value_col: str, polluant=None) -> pd.DataFrame:
+    """Pivot ZAS x polluant des moyennes (calcul seul, sans affichage)."""
+    df_used = df[['Zas', 'Polluant', value_col]]
     if polluant:
         df_used = df_used[df_used['Polluant'] == polluant]
-        if df_used.empty:
-            st.warning(f"Aucune donnée pour le polluant demandé : '{polluant}'.")
-            return
-        st.caption(f"Polluant affiché : **{polluant}** (après filtration : {len(df_used):,} lignes)")
-    df_used[value_col] = pd.to_numeric(df_used[value_col], errors='coerce')
-    df_pivot = (
+        count_copy(df_used, "heatmap")
+    df_used = df_used.assign(**{value_col: pd.to_numeric(df_used[value_col], errors='coerce')})
+    return (
         df_used.groupby(['Zas', 'Polluant'], as_index=False)[value_col]
         .mean()
         .pivot(index='Zas', columns='Polluant', values=value_col)
     )
+
+def heatmap_polluant_zone(df: pd.DataFrame, key=None, polluant=None, pivot=None, n_rows=None):
+    """Avec un pivot déjà calculé, `df` n'est pas parcouru (il peut valoir None)."""
+    st.markdown("#### Carte thermique : moyenne des polluants par zone (ZAS)")
+    if pivot is None:
+        if df is None or len(df) == 0:
+            st.warning("Pas de données dans le DataFrame fourni à la heatmap.")
+            return
+        value_col = None
+        if 'valeur' in df.columns:
+            value_col = 'valeur'
+        elif 'valeur_moyenne' in df.columns:
+            value_col = 'valeur_moyenne'
+        else:
+            st.warning("Les colonnes nécessaires ('valeur' ou 'valeur_moyenne') sont manquantes. Vérifiez le prétraitement.")
+            return
+        if not all(col in df.columns for col in ['Zas', 'Polluant']):
+            st.warning("Les colonnes nécessaires ('Zas', 'Polluant') sont manquantes.")
+            return
+        if polluant:
+            n_rows = int((df['Polluant'] == polluant).sum())
+            if n_rows == 0:
+                st.warning(f"Aucune donnée pour le polluant demandé : '{polluant}'.")
+                return
+        pivot = heatmap_table(df, value_col, polluant=polluant)
+    if polluant and n_rows is not None:
+        st.caption(f"Polluant affiché : **{polluant}** (après filtration : {n_rows:,} lignes)")
+    df_pivot = pivot
     if df_pivot.empty:
         st.warning("Aucun point à afficher après agrégation / pivot. Vérifiez les valeurs de 'Zas' et 'Polluant'.")
         return
@@ -74,11 +119,8 @@ def show_summary(df: pd.DataFrame):
     col3.metric("Nombre de zones (ZAS)", df['Zas'].nunique())
     st.caption("Ces chiffres donnent un aperçu global de la taille du dataset et de la diversité des mesures.")
 
-def map_zones_pollution(df):
-    st.markdown("#### Analyse par Zones de Surveillance Atmosphérique (ZAS)")
-    if 'Zas' not in df.columns or df['Zas'].isna().all():
-        st.warning("Aucune donnée de ZAS disponible")
-        return
+def zas_stats(df: pd.DataFrame) -> pd.DataFrame:
+    """Statistiques par ZAS utilisées par map_zones_pollution (calcul seul, sans affichage)."""
     df_zas = (
         df.groupby('Zas', as_index=False)
         .agg({
@@ -89,7 +131,44 @@ def map_zones_pollution(df):
     )
     df_zas.columns = ['Zas', 'valeur_moyenne', 'valeur_mediane', 'ecart_type',
                        'valeur_min', 'valeur_max', 'nb_mesures', 'nb_polluants', 'Organisme']
-    df_zas = df_zas.sort_values('valeur_moyenne', ascending=False)
+    return df_zas.sort_values('valeur_moyenne', ascending=False)
+
+def deep_dive_tables(df: pd.DataFrame, metric, regions, date_range) -> dict:
+    """
+    Filtre la sélection puis calcule les statistiques par ZAS et le pivot de la heatmap (calcul seul,
+    exécuté dans le pool : le thread du script ne parcourt jamais le dataset complet).
+    """
+    df_sel = filter_selection(df, metric, regions, date_range)
+    count_copy(df_sel, "filtres sidebar")
+    return {"zas": zas_stats(df_sel), "pivot": heatmap_table(df_sel, 'valeur'), "n_rows": len(df_sel)}
+
+def approx_zas_chart(estimates: pd.DataFrame):
+    st.markdown("#### Analyse par Zones de Surveillance Atmosphérique (ZAS) — estimation")
+    if estimates.empty:
+        st.warning("Aucune donnée de ZAS disponible")
+        return
+    top_20 = estimates.sort_values('valeur_moyenne', ascending=False).head(20)
+    fig = px.bar(top_20, y='Zas', x='valeur_moyenne', error_x='ic', orientation='h', color='valeur_moyenne',
+                 color_continuous_scale='YlOrRd', title="Concentration moyenne estimée par zone (µg/m³, IC 95 %)",
+                 hover_data={'valeur_moyenne': ':.2f', 'ic': ':.2f', 'nb_mesures_estime': ':,', 'nb_echantillon': ':,'},
+                 labels={'valeur_moyenne': 'Concentration moyenne (µg/m³)', 'Zas': 'Zone', 'ic': '± IC 95 %',
+                         'nb_mesures_estime': 'Mesures (estimation)', 'nb_echantillon': 'Mesures échantillonnées'})
+    fig.update_layout(showlegend=False, height=600, yaxis={'categoryorder': 'total ascending'},
+                      margin=dict(l=200, r=40, t=60, b=40))
+    st.plotly_chart(fig, use_container_width=True, key="approx_zones_bar_fig")
+    st.caption(f"Estimation sur un échantillon stratifié de {int(estimates['nb_echantillon'].sum()):,} mesures : "
+               "les barres d'erreur donnent l'intervalle de confiance à 95 %. Le résultat exact s'affiche dès qu'il est calculé.")
+
+def map_zones_pollution(df, df_zas=None):
+    st.markdown("#### Analyse par Zones de Surveillance Atmosphérique (ZAS)")
+    if df_zas is None:
+        if 'Zas' not in df.columns or df['Zas'].isna().all():
+            st.warning("Aucune donnée de ZAS disponible")
+            return
+        df_zas = zas_stats(df)
+    if df_zas.empty:
+        st.warning("Aucune donnée de ZAS disponible")
+        return
     col1, col2, col3, col4 = st.columns(4)
     col1.metric("Zones totales", f"{len(df_zas)}")
     col2.metric("Mesures totales", f"{df_zas['nb_mesures'].sum():,}")
@@ -433,27 +512,42 @@ def map_interactive_zas(df):
     col4.metric("Maximum", f"{df_zas_mapped['valeur_moyenne'].max():.2f} µg/m³")
     st.caption("Chaque marqueur représente une zone de surveillance atmosphérique (ZAS). La taille du point est proportionnelle au nombre de mesures enregistrées, tandis que la couleur indique le niveau moyen de pollution observé sur la période : plus la couleur tend vers le rouge, plus la concentration mesurée est élevée. Survolez les marqueurs pour voir les détails.")
 
-def dominant_pollutant_table(df: pd.DataFrame, max_cols_display=20):
-    if df is None or df.empty:
-        st.warning("Pas de données pour calculer le polluant dominant.")
+def episodes_timeline(episodes: pd.DataFrame):
+    if episodes is None or episodes.empty:
+        st.info("Aucun épisode de pollution pour cette sélection.")
         return
-    if 'valeur' in df.columns:
-        value_col = 'valeur'
-    elif 'valeur_moyenne' in df.columns:
-        value_col = 'valeur_moyenne'
-    else:
-        st.warning("Colonne de valeurs introuvable.")
-        return
-    gp = df.groupby(['Zas', 'Polluant'], as_index=False)[value_col].mean()
-    pivot = gp.pivot(index='Zas', columns='Polluant', values=value_col)
-    if pivot.empty:
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Épisodes", f"{len(episodes):,}")
+    col2.metric("Durée médiane", f"{episodes['duree_h'].median():.0f} h")
+    col3.metric("Pic maximal", f"{episodes['pic'].max():.1f} µg/m³")
+    fig = px.timeline(episodes, x_start='debut', x_end='fin', y='Zas', color='Polluant',
+                      hover_data={'duree_h': True, 'pic': ':.1f', 'dose': ':.0f', 'seuil': ':.0f', 'reference': True},
+                      labels={'duree_h': 'Durée (h)', 'pic': 'Pic (µg/m³)', 'dose': 'Dose (µg/m³·h)', 'seuil': 'Seuil',
+                              'reference': 'Comparé à'},
+                      template='plotly_white')
+    fig.update_layout(height=max(300, 22 * episodes['Zas'].nunique()), yaxis_title=None,
+                      margin=dict(l=200, r=40, t=40, b=40))
+    st.plotly_chart(fig, use_container_width=True, key="episodes_timeline_fig")
+    st.dataframe(episodes.sort_values('dose', ascending=False).round({'pic': 1, 'dose': 1}),
+                 use_container_width=True, height=300)
+
+def dominant_pollutant_table(df: pd.DataFrame, max_cols_display=20, result=None):
+    """`result` : tableau déjà calculé par dominant_pollutants() (df n'est alors pas parcouru)."""
+    if result is None:
+        if df is None or df.empty:
+            st.warning("Pas de données pour calculer le polluant dominant.")
+            return
+        if 'valeur' in df.columns:
+            value_col = 'valeur'
+        elif 'valeur_moyenne' in df.columns:
+            value_col = 'valeur_moyenne'
+        else:
+            st.warning("Colonne de valeurs introuvable.")
+            return
+        result = dominant_pollutants(df, value_col)
+    if result.empty:
         st.warning("Aucun résultat après pivot — vérifie Zas / Polluant.")
         return
-    dominant = pivot.idxmax(axis=1)
-    dominant_val = pivot.max(axis=1)
-    result = pivot.reset_index()
-    result['dominant_pollutant'] = dominant.values
-    result['dominant_valeur'] = dominant_val.values.round(4)
     st.markdown("#### Tableau complet : moyennes par polluant et polluant dominant par ZAS")
     if result.shape[1] > max_cols_display:
         st.caption(f"Le tableau contient {result.shape[1]} colonnes ; certaines colonnes peuvent être masquées pour lisibilité.")